@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,7 +59,51 @@ ROOT_URLCONF = "order_service.urls"
 CORS_ALLOW_ALL_ORIGINS = True
 
 # RabbitMQ Configuration
-RABBITMQ_HOST = "rabbitmq"
+RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "rabbitmq")
+RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", "5672"))
+RABBITMQ_USER = os.environ.get("RABBITMQ_USER", "hellofresh")
+RABBITMQ_PASSWORD = os.environ.get("RABBITMQ_PASSWORD", "food")
+
+# Upstream services
+# Each service lists one or more replica base URLs (comma separated in the
+# environment) and is load balanced client-side, see orders/upstreams.py.
+UPSTREAM_LOAD_BALANCER = os.environ.get("UPSTREAM_LOAD_BALANCER", "least_outstanding")
+
+
+def _env_urls(name, default):
+    urls = os.environ.get(name, default).split(",")
+    return [url.strip() for url in urls if url.strip()]
+
+
+UPSTREAMS = {
+    "user-service": {
+        "endpoints": _env_urls("USER_SERVICE_URLS", "http://user-service:8080"),
+        "load_balancer": UPSTREAM_LOAD_BALANCER,
+        "timeout": 5.0,
+        "pool_maxsize": 10,
+        "consecutive_failures": 3,
+        "base_ejection_time": 30.0,
+    },
+    "product-service": {
+        "endpoints": _env_urls("PRODUCT_SERVICE_URLS", "http://product-service:8080"),
+        "load_balancer": UPSTREAM_LOAD_BALANCER,
+        "timeout": 5.0,
+        "pool_maxsize": 10,
+        "consecutive_failures": 3,
+        "base_ejection_time": 30.0,
+    },
+}
+
+# Tracing
+# New traces are sampled with probability TRACING_SAMPLE_RATE (0 disables
+# tracing). Finished spans are passed to TRACING_EXPORTER, see orders/tracing.py.
+TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", "0"))
+TRACING_FILE = os.environ.get("TRACING_FILE")
+TRACING_EXPORTER = os.environ.get(
+    "TRACING_EXPORTER",
+    "orders.tracing.FileExporter" if TRACING_FILE else "orders.tracing.ConsoleExporter",
+)
+TRACING_EXPORTER_OPTIONS = {"path": TRACING_FILE} if TRACING_FILE else {}
 
 TEMPLATES = [
     {
@@ -0,0 +1,249 @@
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+
+import pika
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Message:
+    """
+    A message delivered to a consumer handler.
+
+    Attributes:
+        body (bytes): The raw message body.
+        headers (dict): The AMQP message headers, e.g. the tracing `traceparent`.
+        routing_key (str): The routing key the message was published with.
+    """
+
+    def __init__(self, body, headers=None, routing_key=None):
+        self.body = body
+        self.headers = headers or {}
+        self.routing_key = routing_key
+
+    def json(self):
+        """
+        Decode the message body as JSON.
+
+        Returns:
+            dict: The decoded body.
+        """
+        return json.loads(self.body)
+
+
+def log_orders(messages):
+    """
+    Default handler that logs the id of each created order.
+
+    Parameters:
+        messages (list[Message]): A batch of `created_order` messages.
+    """
+    for message in messages:
+        order = message.json()["payload"]["order"]
+        logger.info("Received created_order %s", order["order_id"])
+
+
+def rabbitmq_connection():
+    """
+    Open a blocking connection to the RabbitMQ broker configured in settings.
+
+    Returns:
+        pika.BlockingConnection: The open connection.
+    """
+    return pika.BlockingConnection(
+        pika.ConnectionParameters(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            credentials=pika.PlainCredentials(
+                settings.RABBITMQ_USER, settings.RABBITMQ_PASSWORD
+            ),
+        )
+    )
+
+
+class _Batch:
+    def __init__(self, delivery_tags, future):
+        self.first_tag = delivery_tags[0]
+        self.last_tag = delivery_tags[-1]
+        self.future = future
+
+
+class BatchConsumer:
+    """
+    Consume messages from a queue bound to an exchange and handle them in batches.
+
+    Messages are collected until `batch_size` messages have arrived or the first
+    message of the batch is `batch_timeout` seconds old, then handed to `handler`
+    on a thread or process pool. Up to `prefetch_count` messages are delivered
+    ahead of being acknowledged, so several batches can be handled in parallel.
+
+    A batch is acknowledged with a single `basic_ack(multiple=True)` once it and
+    every batch delivered before it have been handled, which keeps the ack order
+    correct when batches finish out of order. If the handler raises, the messages
+    of the batch are rejected and, unless `requeue_on_error` is set, dropped or
+    dead-lettered by the broker.
+
+    All channel operations happen on the thread calling `run`, since pika
+    connections are not thread safe. Workers signal completion through
+    `add_callback_threadsafe`.
+
+    Parameters:
+        handler (callable): Called with a list of `Message`. Must be picklable,
+            e.g. a module level function, when `pool` is "process".
+        queue (str): Name of the queue to consume from.
+        exchange (str): Exchange to bind the queue to.
+        routing_key (str): Routing key to bind the queue with.
+        prefetch_count (int): Maximum number of unacknowledged messages, 0 for
+            unlimited as in AMQP.
+        batch_size (int): Maximum number of messages per handler call.
+        batch_timeout (float): Seconds to wait for a batch to fill up.
+        workers (int): Number of threads or processes handling batches.
+        pool (str): "thread" or "process".
+        requeue_on_error (bool): Requeue the messages of a failed batch.
+        connection_factory (callable): Returns a new `pika.BlockingConnection`.
+    """
+
+    POOLS = {
+        "thread": concurrent.futures.ThreadPoolExecutor,
+        "process": concurrent.futures.ProcessPoolExecutor,
+    }
+
+    def __init__(
+        self,
+        handler,
+        queue,
+        exchange="orders",
+        routing_key="created_order",
+        prefetch_count=200,
+        batch_size=50,
+        batch_timeout=0.5,
+        workers=4,
+        pool="thread",
+        requeue_on_error=False,
+        connection_factory=rabbitmq_connection,
+    ):
+        if pool not in self.POOLS:
+            raise ValueError(f"Unknown pool: {pool}")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if prefetch_count < 0:
+            raise ValueError("prefetch_count cannot be negative")
+        if prefetch_count and batch_size > prefetch_count:
+            raise ValueError("batch_size cannot be larger than prefetch_count")
+
+        self.handler = handler
+        self.queue = queue
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.prefetch_count = prefetch_count
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.workers = workers
+        self.pool = pool
+        self.requeue_on_error = requeue_on_error
+        self.connection_factory = connection_factory
+        self._stopping = threading.Event()
+        self._pending = deque()
+
+    def stop(self):
+        """
+        Ask `run` to stop. Safe to call from signal handlers and other threads.
+
+        Messages already delivered are handled and acknowledged before `run` returns.
+        """
+        self._stopping.set()
+
+    def run(self):
+        """
+        Consume messages until `stop` is called.
+        """
+        connection = self.connection_factory()
+        try:
+            channel = connection.channel()
+            channel.exchange_declare(exchange=self.exchange, exchange_type="direct")
+            channel.queue_declare(queue=self.queue, durable=True)
+            channel.queue_bind(
+                queue=self.queue, exchange=self.exchange, routing_key=self.routing_key
+            )
+            channel.basic_qos(prefetch_count=self.prefetch_count)
+
+            with self.POOLS[self.pool](max_workers=self.workers) as executor:
+                self._consume(connection, channel, executor)
+        finally:
+            if connection.is_open:
+                connection.close()
+
+    def _consume(self, connection, channel, executor):
+        settle = partial(
+            connection.add_callback_threadsafe, partial(self._settle, channel)
+        )
+        tags, messages = [], []
+        batch_started = None
+
+        for method, properties, body in channel.consume(
+            self.queue, inactivity_timeout=min(self.batch_timeout, 0.1)
+        ):
+            if method is not None:
+                tags.append(method.delivery_tag)
+                messages.append(Message(body, properties.headers, method.routing_key))
+                if batch_started is None:
+                    batch_started = time.monotonic()
+
+            if messages and (
+                len(messages) >= self.batch_size
+                or time.monotonic() - batch_started >= self.batch_timeout
+                or self._stopping.is_set()
+            ):
+                self._submit(executor, tags, messages, settle)
+                tags, messages = [], []
+                batch_started = None
+
+            if self._stopping.is_set():
+                break
+
+        channel.cancel()
+        concurrent.futures.wait([batch.future for batch in self._pending])
+        self._settle(channel)
+
+    def _submit(self, executor, tags, messages, settle):
+        future = executor.submit(self.handler, messages)
+        self._pending.append(_Batch(tags, future))
+        future.add_done_callback(lambda f: settle())
+
+    def _settle(self, channel):
+        """
+        Acknowledge or reject the finished batches at the head of the pending queue.
+        """
+        last_acked = None
+        while self._pending and self._pending[0].future.done():
+            batch = self._pending.popleft()
+            exception = batch.future.exception()
+            if exception is None:
+                last_acked = batch.last_tag
+                continue
+
+            if last_acked is not None:
+                channel.basic_ack(delivery_tag=last_acked, multiple=True)
+                last_acked = None
+            logger.error(
+                "Handler failed for messages %d-%d: %r",
+                batch.first_tag,
+                batch.last_tag,
+                exception,
+            )
+            channel.basic_nack(
+                delivery_tag=batch.last_tag,
+                multiple=True,
+                requeue=self.requeue_on_error,
+            )
+
+        if last_acked is not None:
+            channel.basic_ack(delivery_tag=last_acked, multiple=True)
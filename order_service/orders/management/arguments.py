@@ -0,0 +1,11 @@
+import argparse
+
+
+def positive_int(value):
+    """
+    Argument type accepting integers of at least 1.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
@@ -0,0 +1,153 @@
+import threading
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.consumers import BatchConsumer
+from orders.management.arguments import positive_int
+from orders.memory_broker import MemoryBroker
+
+
+def simulated_handler(call_latency, message_cost, messages):
+    """
+    Handler that sleeps like a batched database write.
+
+    Parameters:
+        call_latency (float): Fixed seconds per handler call.
+        message_cost (float): Additional seconds per message.
+        messages (list[Message]): The batch of messages.
+    """
+    time.sleep(call_latency + message_cost * len(messages))
+
+
+class Command(BaseCommand):
+    """
+    Measure `BatchConsumer` throughput against the in-memory broker stand-in.
+
+    Compares one-message-at-a-time consumption (prefetch 1, batch size 1, one
+    worker) with the configured prefetch, batch size and pool. The broker round
+    trip and handler costs are simulated with sleeps, so no RabbitMQ is needed.
+
+    Usage:
+        python manage.py benchmark_consumer --messages 2000 --workers 4
+    """
+
+    help = "Benchmark BatchConsumer throughput against an in-memory broker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=positive_int, default=2000)
+        parser.add_argument("--prefetch", type=int, default=200)
+        parser.add_argument("--batch-size", type=positive_int, default=50)
+        parser.add_argument("--workers", type=positive_int, default=4)
+        parser.add_argument(
+            "--pool", choices=sorted(BatchConsumer.POOLS), default="thread"
+        )
+        parser.add_argument(
+            "--ack-latency",
+            type=float,
+            default=0.0005,
+            help="Simulated broker round trip per ack in seconds.",
+        )
+        parser.add_argument(
+            "--call-latency",
+            type=float,
+            default=0.001,
+            help="Simulated fixed cost per handler call in seconds.",
+        )
+        parser.add_argument(
+            "--message-cost",
+            type=float,
+            default=0.00005,
+            help="Simulated cost per message in seconds.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=300.0,
+            help="Seconds to wait for each run to consume every message.",
+        )
+
+    def run_consumer(self, messages, ack_latency, timeout, handler, **consumer_options):
+        broker = MemoryBroker(ack_latency=ack_latency)
+        broker.bindings[("orders", "created_order")].add("benchmark")
+        for i in range(messages):
+            broker.publish("orders", "created_order", b'{"order_id": %d}' % i)
+
+        try:
+            consumer = BatchConsumer(
+                handler,
+                queue="benchmark",
+                batch_timeout=0.05,
+                connection_factory=broker.connection,
+                **consumer_options,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        errors = []
+
+        def run():
+            try:
+                consumer.run()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        thread.start()
+        while broker.acked + broker.rejected < messages:
+            if not thread.is_alive():
+                break
+            if time.monotonic() > deadline:
+                consumer.stop()
+                thread.join()
+                raise CommandError(
+                    f"Timed out after {timeout}s with "
+                    f"{broker.acked + broker.rejected} of {messages} messages settled"
+                )
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - started
+        consumer.stop()
+        thread.join()
+        if errors:
+            raise CommandError(f"Consumer failed: {errors[0]!r}") from errors[0]
+        return elapsed, broker.ack_calls
+
+    def handle(self, *args, **options):
+        messages = options["messages"]
+        handler = partial(
+            simulated_handler, options["call_latency"], options["message_cost"]
+        )
+        runs = [
+            (
+                "one at a time",
+                {"prefetch_count": 1, "batch_size": 1, "workers": 1},
+            ),
+            (
+                f"prefetch={options['prefetch']} batch={options['batch_size']} "
+                f"workers={options['workers']} pool={options['pool']}",
+                {
+                    "prefetch_count": options["prefetch"],
+                    "batch_size": options["batch_size"],
+                    "workers": options["workers"],
+                    "pool": options["pool"],
+                },
+            ),
+        ]
+
+        baseline = None
+        for name, consumer_options in runs:
+            elapsed, ack_calls = self.run_consumer(
+                messages,
+                options["ack_latency"],
+                options["timeout"],
+                handler,
+                **consumer_options,
+            )
+            rate = messages / elapsed
+            baseline = baseline or rate
+            self.stdout.write(
+                f"{name:<50} {rate:>10.0f} msg/s  {ack_calls:>6} acks  "
+                f"{rate / baseline:>5.1f}x"
+            )
@@ -0,0 +1,76 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from orders.consumers import BatchConsumer
+from orders.management.arguments import positive_int
+
+
+class Command(BaseCommand):
+    """
+    Consume `created_order` messages from the `orders` exchange in batches.
+
+    Usage:
+        python manage.py consume_orders --queue billing.created_order \
+            --handler billing.handlers.handle_orders --prefetch 200 --batch-size 50
+
+    SIGINT and SIGTERM stop the consumer after the messages already delivered
+    have been handled and acknowledged.
+    """
+
+    help = "Consume created_order messages from the orders exchange in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", default="order_service.created_order")
+        parser.add_argument("--exchange", default="orders")
+        parser.add_argument("--routing-key", default="created_order")
+        parser.add_argument(
+            "--handler",
+            default="orders.consumers.log_orders",
+            help="Dotted path of a callable taking a list of messages.",
+        )
+        parser.add_argument(
+            "--prefetch",
+            type=int,
+            default=200,
+            help="Maximum number of unacknowledged messages, 0 for unlimited.",
+        )
+        parser.add_argument("--batch-size", type=positive_int, default=50)
+        parser.add_argument("--batch-timeout", type=float, default=0.5)
+        parser.add_argument("--workers", type=positive_int, default=4)
+        parser.add_argument(
+            "--pool", choices=sorted(BatchConsumer.POOLS), default="thread"
+        )
+        parser.add_argument("--requeue-on-error", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            consumer = BatchConsumer(
+                import_string(options["handler"]),
+                queue=options["queue"],
+                exchange=options["exchange"],
+                routing_key=options["routing_key"],
+                prefetch_count=options["prefetch"],
+                batch_size=options["batch_size"],
+                batch_timeout=options["batch_timeout"],
+                workers=options["workers"],
+                pool=options["pool"],
+                requeue_on_error=options["requeue_on_error"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping, finishing delivered messages...")
+            consumer.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(
+            f"Consuming {options['exchange']}/{options['routing_key']} "
+            f"from {options['queue']}"
+        )
+        consumer.run()
+        self.stdout.write(self.style.SUCCESS("Consumer stopped"))
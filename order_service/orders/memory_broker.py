@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+
+class _Method:
+    def __init__(self, delivery_tag, routing_key):
+        self.delivery_tag = delivery_tag
+        self.routing_key = routing_key
+
+
+class _Properties:
+    def __init__(self, headers=None):
+        self.headers = headers
+
+
+class MemoryBroker:
+    """
+    In-process stand-in for a RabbitMQ broker, for tests and benchmarks.
+
+    Implements the subset of the `pika.BlockingConnection` API used by
+    `orders.consumers.BatchConsumer`: direct exchanges, durable queues, prefetch,
+    single and multiple acks and nacks, and `add_callback_threadsafe`.
+
+    Parameters:
+        ack_latency (float): Seconds each `basic_ack` and `basic_nack` call blocks,
+            simulating the network round trip to a real broker.
+    """
+
+    def __init__(self, ack_latency=0.0):
+        self.ack_latency = ack_latency
+        self.queues = defaultdict(deque)
+        self.bindings = defaultdict(set)
+        self.delivered = 0
+        self.acked = 0
+        self.rejected = 0
+        self.ack_calls = 0
+        self._lock = threading.Lock()
+
+    def publish(self, exchange, routing_key, body, headers=None):
+        """
+        Route a message to every queue bound to `exchange` with `routing_key`.
+        """
+        with self._lock:
+            for name in self.bindings[(exchange, routing_key)]:
+                self.queues[name].append((routing_key, body, headers))
+
+    def connection(self):
+        """
+        Open a new connection to the broker.
+
+        Returns:
+            MemoryConnection: The open connection.
+        """
+        return MemoryConnection(self)
+
+
+class MemoryConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+        self._callbacks = queue.Queue()
+
+    def channel(self):
+        return MemoryChannel(self)
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.put(callback)
+
+    def process_callbacks(self, timeout=None):
+        """
+        Run pending thread-safe callbacks, waiting up to `timeout` for the first one.
+
+        Returns:
+            bool: True if at least one callback was run.
+        """
+        try:
+            callback = self._callbacks.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        callback()
+        while True:
+            try:
+                callback = self._callbacks.get_nowait()
+            except queue.Empty:
+                return True
+            callback()
+
+    def close(self):
+        self.is_open = False
+
+
+class MemoryChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.broker = connection.broker
+        self.prefetch_count = 0
+        self._delivery_tag = 0
+        self._unacked = {}
+        self._consuming = False
+
+    def exchange_declare(self, exchange, exchange_type="direct", **kwargs):
+        pass
+
+    def queue_declare(self, queue, **kwargs):
+        self.broker.queues[queue]
+
+    def queue_bind(self, queue, exchange, routing_key=None, **kwargs):
+        with self.broker._lock:
+            self.broker.bindings[(exchange, routing_key)].add(queue)
+
+    def basic_qos(self, prefetch_count=0, **kwargs):
+        self.prefetch_count = prefetch_count
+
+    def consume(self, queue, inactivity_timeout=None):
+        """
+        Yield `(method, properties, body)` for each delivered message.
+
+        Yields `(None, None, None)` when no message could be delivered for
+        `inactivity_timeout` seconds, like `pika.BlockingChannel.consume`.
+        """
+        self._consuming = True
+        messages = self.broker.queues[queue]
+        while self._consuming:
+            self.connection.process_callbacks(timeout=0)
+            if messages and (
+                not self.prefetch_count or len(self._unacked) < self.prefetch_count
+            ):
+                with self.broker._lock:
+                    message = messages.popleft()
+                self._delivery_tag += 1
+                self._unacked[self._delivery_tag] = (queue, message)
+                self.broker.delivered += 1
+                routing_key, body, headers = message
+                yield (
+                    _Method(self._delivery_tag, routing_key),
+                    _Properties(headers),
+                    body,
+                )
+            elif not self.connection.process_callbacks(timeout=inactivity_timeout):
+                yield None, None, None
+
+    def cancel(self):
+        self._consuming = False
+        return 0
+
+    def _settle(self, delivery_tag, multiple):
+        time.sleep(self.broker.ack_latency)
+        if multiple:
+            tags = [tag for tag in self._unacked if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag]
+        return [self._unacked.pop(tag) for tag in tags]
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        settled = self._settle(delivery_tag, multiple)
+        self.broker.ack_calls += 1
+        self.broker.acked += len(settled)
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        settled = self._settle(delivery_tag, multiple)
+        self.broker.rejected += len(settled)
+        if requeue:
+            with self.broker._lock:
+                for queue, message in reversed(settled):
+                    self.broker.queues[queue].appendleft(message)
@@ -1,9 +1,17 @@
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.urls import reverse
+from .consumers import BatchConsumer
+from .memory_broker import MemoryBroker
 from .models import Order
 from .serializers import OrderSerializer
+from .tracing import Tracer, parse_traceparent
+from .upstreams import NoEndpointsConfigured, Upstream, UpstreamRegistry
+import requests
+import threading
+import time
 from unittest.mock import patch, MagicMock
 
 
@@ -111,7 +119,7 @@ class OrderCreateViewTest(TestCase):
         """
         self.client = APIClient()
 
-    @patch("orders.views.requests.get")
+    @patch("orders.upstreams.requests.Session.get")
     @patch("orders.views.pika.BlockingConnection")
     def test_create_order(self, mock_rabbitmq, mock_get):
         """
@@ -175,3 +183,633 @@ class OrderCreateViewTest(TestCase):
         )  # Comes from mocked response
         self.assertEqual(response.data["total_amount"], 50.0)
         self.assertIsNotNone(response.data["created_at"])
+
+
+class UpstreamTest(SimpleTestCase):
+    def test_least_outstanding_prefers_idle_endpoint(self):
+        """
+        Test that the least-outstanding balancer avoids an endpoint with requests in flight.
+
+        Returns:
+            None
+        """
+        # Arrange
+        upstream = Upstream("product-service", ["http://slow:8080", "http://fast:8080"])
+        slow = upstream.acquire()
+
+        # Act
+        endpoint = upstream.acquire()
+
+        # Assert
+        self.assertIsNot(endpoint, slow)
+        self.assertEqual(slow.outstanding, 1)
+        self.assertEqual(endpoint.outstanding, 1)
+
+    def test_power_of_two_picks_less_loaded_of_sample(self):
+        """
+        Test that the power-of-two-choices balancer never picks the busiest endpoint.
+
+        Returns:
+            None
+        """
+        # Arrange
+        upstream = Upstream(
+            "product-service",
+            ["http://a:8080", "http://b:8080", "http://c:8080"],
+            load_balancer="power_of_two",
+        )
+        busy = upstream.endpoints[0]
+        busy.outstanding = 100
+
+        # Act
+        chosen = {upstream.acquire() for _ in range(20)}
+
+        # Assert
+        self.assertNotIn(busy, chosen)
+
+    def test_endpoint_ejected_after_consecutive_failures(self):
+        """
+        Test that an endpoint is ejected after repeated failures and skipped afterwards.
+
+        Returns:
+            None
+        """
+        # Arrange
+        upstream = Upstream(
+            "user-service",
+            ["http://broken:8080", "http://healthy:8080"],
+            consecutive_failures=2,
+        )
+        broken, healthy = upstream.endpoints
+
+        # Act
+        for _ in range(2):
+            broken.outstanding += 1
+            upstream.release(broken, success=False)
+
+        # Assert
+        self.assertEqual(broken.ejection_count, 1)
+        for _ in range(5):
+            endpoint = upstream.acquire()
+            self.assertIs(endpoint, healthy)
+            upstream.release(endpoint, success=True)
+
+    @patch("orders.upstreams.time.monotonic")
+    def test_recovered_endpoint_ejection_time_resets(self, mock_monotonic):
+        """
+        Test that an endpoint which recovered from an ejection is next ejected for
+        the base ejection time again, not a multiple of it.
+
+        Returns:
+            None
+        """
+        # Arrange
+        upstream = Upstream(
+            "user-service",
+            ["http://flaky:8080"],
+            consecutive_failures=1,
+            base_ejection_time=30.0,
+        )
+        endpoint = upstream.endpoints[0]
+        mock_monotonic.return_value = 1000.0
+
+        # Act
+        upstream.release(upstream.acquire(), success=False)
+        first_ejection = endpoint.ejected_until - 1000.0
+        mock_monotonic.return_value = 1100.0
+        upstream.release(upstream.acquire(), success=True)
+        upstream.release(upstream.acquire(), success=False)
+
+        # Assert
+        self.assertEqual(first_ejection, 30.0)
+        self.assertEqual(endpoint.ejection_count, 1)
+        self.assertEqual(endpoint.ejected_until - 1100.0, 30.0)
+
+    def test_all_endpoints_ejected_falls_back_to_all(self):
+        """
+        Test that requests are still routed when every endpoint is ejected.
+
+        Returns:
+            None
+        """
+        # Arrange
+        upstream = Upstream(
+            "user-service", ["http://only:8080"], consecutive_failures=1
+        )
+        endpoint = upstream.acquire()
+        upstream.release(endpoint, success=False)
+
+        # Act
+        chosen = upstream.acquire()
+
+        # Assert
+        self.assertIs(chosen, endpoint)
+
+    @patch("orders.upstreams.requests.Session.get")
+    def test_get_records_server_errors_as_failures(self, mock_get):
+        """
+        Test that 5xx responses and connection errors count as endpoint failures.
+
+        Returns:
+            None
+        """
+        # Arrange
+        upstream = Upstream("user-service", ["http://user-service:8080"])
+        endpoint = upstream.endpoints[0]
+        server_error = MagicMock(status_code=500)
+        mock_get.side_effect = [server_error, requests.ConnectionError()]
+
+        # Act
+        response = upstream.get("/users/1")
+        with self.assertRaises(requests.ConnectionError):
+            upstream.get("/users/1")
+
+        # Assert
+        self.assertIs(response, server_error)
+        mock_get.assert_called_with(
+            "http://user-service:8080/users/1", headers={}, timeout=5.0
+        )
+        self.assertEqual(endpoint.consecutive_failures, 2)
+        self.assertEqual(endpoint.outstanding, 0)
+
+    def test_registry_unknown_service(self):
+        """
+        Test that looking up an unconfigured service raises NoEndpointsConfigured.
+
+        Returns:
+            None
+        """
+        # Arrange
+        registry = UpstreamRegistry(
+            {"user-service": {"endpoints": ["http://user-service:8080"]}}
+        )
+
+        # Act / Assert
+        self.assertEqual(registry["user-service"].name, "user-service")
+        with self.assertRaises(NoEndpointsConfigured):
+            registry["product-service"]
+
+
+class RecordingExporter:
+    """
+    Tracing exporter that keeps finished spans in memory for assertions.
+    """
+
+    spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class TracerTest(SimpleTestCase):
+    def setUp(self):
+        """
+        Set up a tracer that samples every trace and records its spans.
+
+        Returns:
+            None
+        """
+        self.exporter = RecordingExporter()
+        self.exporter.spans = []
+        self.tracer = Tracer(sample_rate=1.0, exporter=self.exporter)
+
+    def test_child_span_shares_trace_with_parent(self):
+        """
+        Test that nested spans form a single trace and are exported on exit.
+
+        Returns:
+            None
+        """
+        # Act
+        with self.tracer.start_span("root") as root:
+            with self.tracer.start_span("child", {"key": "value"}) as child:
+                headers = self.tracer.inject({})
+
+        # Assert
+        self.assertEqual([s.name for s in self.exporter.spans], ["child", "root"])
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertEqual(child.attributes, {"key": "value"})
+        self.assertEqual(
+            headers, {"traceparent": f"00-{root.trace_id}-{child.span_id}-01"}
+        )
+
+    def test_span_continues_incoming_traceparent(self):
+        """
+        Test that a root span continues the trace of an incoming traceparent header.
+
+        Returns:
+            None
+        """
+        # Arrange
+        traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+        # Act
+        with self.tracer.start_span("root", traceparent=traceparent) as span:
+            pass
+
+        # Assert
+        self.assertEqual(span.trace_id, "0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(span.parent_id, "b7ad6b7169203331")
+        self.assertIsNone(parse_traceparent("not-a-traceparent"))
+
+    def test_exception_marks_span_as_error(self):
+        """
+        Test that an exception raised inside a span is recorded on it.
+
+        Returns:
+            None
+        """
+        # Act
+        with self.assertRaises(ValueError):
+            with self.tracer.start_span("failing"):
+                raise ValueError("boom")
+
+        # Assert
+        span = self.exporter.spans[0]
+        self.assertEqual(span.status, "error")
+        self.assertEqual(span.attributes["exception.type"], "ValueError")
+
+    def test_disabled_tracer_ignores_sampled_parent(self):
+        """
+        Test that a sample rate of 0 disables tracing even for a sampled parent.
+
+        Returns:
+            None
+        """
+        # Arrange
+        tracer = Tracer(sample_rate=0.0, exporter=self.exporter)
+        sampled = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+        # Act
+        with tracer.start_span("root", traceparent=sampled) as root:
+            with tracer.start_span("child"):
+                headers = tracer.inject({})
+
+        # Assert
+        self.assertFalse(root.sampled)
+        self.assertEqual(headers, {})
+        self.assertEqual(self.exporter.spans, [])
+
+    def test_unsampled_trace_propagates_decision(self):
+        """
+        Test that an unsampled trace exports no spans but propagates its ids unsampled.
+
+        Returns:
+            None
+        """
+        # Arrange
+        tracer = Tracer(sample_rate=0.000001, exporter=self.exporter)
+        unsampled = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"
+
+        # Act
+        with patch("orders.tracing.random.random", return_value=0.5):
+            with tracer.start_span("root") as local_root:
+                local_headers = tracer.inject({})
+        with self.tracer.start_span("root", traceparent=unsampled):
+            with self.tracer.start_span("child") as child:
+                remote_headers = self.tracer.inject({})
+
+        # Assert
+        self.assertEqual(self.exporter.spans, [])
+        self.assertEqual(
+            local_headers,
+            {"traceparent": f"00-{local_root.trace_id}-{local_root.span_id}-00"},
+        )
+        self.assertEqual(
+            remote_headers,
+            {
+                "traceparent": "00-0af7651916cd43dd8448eb211c80319c"
+                f"-{child.span_id}-00"
+            },
+        )
+
+
+@override_settings(
+    TRACING_SAMPLE_RATE=1.0,
+    TRACING_EXPORTER="orders.tests.RecordingExporter",
+    TRACING_EXPORTER_OPTIONS={},
+)
+class OrderCreateViewTracingTest(TestCase):
+    @patch("orders.upstreams.requests.Session.get")
+    @patch("orders.views.pika.BlockingConnection")
+    def test_create_order_traces_upstreams_insert_and_publish(
+        self, mock_rabbitmq, mock_get
+    ):
+        """
+        Test that order creation emits child spans and propagates trace context.
+
+        The test checks that the upstream GETs, the INSERT and the RabbitMQ publish
+        are children of the root span, and that the traceparent header is sent to
+        the upstream services and in the AMQP message headers.
+
+        Returns:
+            None
+        """
+        # Arrange
+        RecordingExporter.spans = []
+        url = reverse("order-create")
+        data = {"user_id": "test_user", "product_code": "test_product"}
+
+        user_service_response = MagicMock(status_code=200)
+        user_service_response.json.return_value = {
+            "firstName": "Test",
+            "lastName": "User",
+        }
+        product_service_response = MagicMock(status_code=200)
+        product_service_response.json.return_value = {
+            "name": "Test Product",
+            "price": 50.0,
+        }
+        mock_get.side_effect = [user_service_response, product_service_response]
+
+        mock_channel = MagicMock()
+        mock_rabbitmq.return_value.__enter__.return_value.channel.return_value = (
+            mock_channel
+        )
+
+        # Act
+        response = self.client.post(
+            url,
+            data,
+            content_type="application/json",
+            HTTP_TRACEPARENT="00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        spans = {span.name: span for span in RecordingExporter.spans}
+        root = spans["OrderCreateView.create"]
+        self.assertEqual(root.trace_id, "0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(root.attributes["http.status_code"], 201)
+        for name in (
+            "GET user-service",
+            "GET product-service",
+            "INSERT orders_order",
+            "publish orders created_order",
+        ):
+            self.assertEqual(spans[name].parent_id, root.span_id)
+
+        user_headers = mock_get.call_args_list[0].kwargs["headers"]
+        self.assertEqual(
+            user_headers["traceparent"], spans["GET user-service"].traceparent()
+        )
+        properties = mock_channel.basic_publish.call_args.kwargs["properties"]
+        self.assertEqual(
+            properties.headers["traceparent"],
+            spans["publish orders created_order"].traceparent(),
+        )
+
+    @patch("orders.upstreams.requests.Session.get")
+    def test_failed_order_marks_root_span_as_error(self, mock_get):
+        """
+        Test that a 500 response from order creation marks the root span as an error.
+
+        The upstream child span is marked as an error both when the request fails
+        and when the upstream service answers with a 5xx response.
+
+        Returns:
+            None
+        """
+        # Arrange
+        server_error = MagicMock(status_code=503)
+        server_error.raise_for_status.side_effect = requests.HTTPError("503")
+        failures = {
+            "connection error": {
+                "side_effect": requests.ConnectionError("user-service is down")
+            },
+            "server error": {"side_effect": None, "return_value": server_error},
+        }
+
+        for name, failure in failures.items():
+            with self.subTest(name):
+                RecordingExporter.spans = []
+                mock_get.configure_mock(**failure)
+
+                # Act
+                response = self.client.post(
+                    reverse("order-create"),
+                    {"user_id": "test_user", "product_code": "test_product"},
+                    content_type="application/json",
+                )
+
+                # Assert
+                self.assertEqual(
+                    response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+                spans = {span.name: span for span in RecordingExporter.spans}
+                root = spans["OrderCreateView.create"]
+                self.assertEqual(root.status, "error")
+                self.assertEqual(root.attributes["http.status_code"], 500)
+                self.assertEqual(spans["GET user-service"].status, "error")
+
+    def test_invalid_order_records_status_without_error(self):
+        """
+        Test that a 400 validation failure is recorded on the root span as a status
+        code, without marking the span as an error or copying the client input.
+
+        Returns:
+            None
+        """
+        # Arrange
+        RecordingExporter.spans = []
+
+        # Act
+        response = self.client.post(
+            reverse("order-create"), {}, content_type="application/json"
+        )
+
+        # Assert
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        (root,) = RecordingExporter.spans
+        self.assertEqual(root.name, "OrderCreateView.create")
+        self.assertEqual(root.status, "ok")
+        self.assertEqual(root.attributes["http.status_code"], 400)
+        self.assertNotIn("exception.message", root.attributes)
+
+
+class BatchConsumerTest(SimpleTestCase):
+    def setUp(self):
+        """
+        Set up an in-memory broker with a queue bound to orders/created_order.
+
+        Returns:
+            None
+        """
+        self.broker = MemoryBroker()
+        self.broker.bindings[("orders", "created_order")].add("test")
+        self.batches = []
+
+    def publish(self, count):
+        for i in range(count):
+            self.broker.publish(
+                "orders",
+                "created_order",
+                b'{"order_id": %d}' % i,
+                headers={"traceparent": "00-%032x-%016x-01" % (i, i)},
+            )
+
+    def consume(self, handler, expected, **options):
+        """
+        Run a consumer in a thread until `expected` messages are settled, then stop it.
+        """
+        consumer = BatchConsumer(
+            handler,
+            queue="test",
+            batch_timeout=0.05,
+            connection_factory=self.broker.connection,
+            **options,
+        )
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while self.broker.acked + self.broker.rejected < expected:
+            self.assertLess(time.monotonic(), deadline, "consumer did not finish")
+            time.sleep(0.001)
+        consumer.stop()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+    def test_messages_handled_in_batches_and_acked(self):
+        """
+        Test that messages are handed to the handler in batches and acked in bulk.
+
+        Returns:
+            None
+        """
+        # Arrange
+        self.publish(25)
+
+        # Act
+        self.consume(
+            self.batches.append, 25, prefetch_count=20, batch_size=10, workers=2
+        )
+
+        # Assert
+        order_ids = [m.json()["order_id"] for batch in self.batches for m in batch]
+        self.assertEqual(sorted(order_ids), list(range(25)))
+        self.assertTrue(all(len(batch) <= 10 for batch in self.batches))
+        self.assertIn("traceparent", self.batches[0][0].headers)
+        self.assertEqual(self.broker.acked, 25)
+        self.assertLess(self.broker.ack_calls, 25)
+        self.assertEqual(len(self.broker.queues["test"]), 0)
+
+    def test_failed_batch_is_rejected(self):
+        """
+        Test that a batch whose handler raises is nacked without losing other batches.
+
+        Returns:
+            None
+        """
+
+        # Arrange
+        def handler(messages):
+            if any(m.json()["order_id"] == 3 for m in messages):
+                raise ValueError("boom")
+
+        self.publish(10)
+
+        # Act
+        with self.assertLogs("orders.consumers", level="ERROR"):
+            self.consume(handler, 10, prefetch_count=10, batch_size=5, workers=1)
+
+        # Assert
+        self.assertEqual(self.broker.acked, 5)
+        self.assertEqual(self.broker.rejected, 5)
+        self.assertEqual(len(self.broker.queues["test"]), 0)
+
+    def test_failed_batch_requeued(self):
+        """
+        Test that a failed batch is put back on the queue when requeue_on_error is set.
+
+        Returns:
+            None
+        """
+        # Arrange
+        self.publish(4)
+
+        def handler(messages):
+            raise ValueError("boom")
+
+        # Act
+        with self.assertLogs("orders.consumers", level="ERROR"):
+            self.consume(
+                handler,
+                4,
+                prefetch_count=4,
+                batch_size=4,
+                workers=1,
+                requeue_on_error=True,
+            )
+
+        # Assert
+        self.assertGreaterEqual(self.broker.rejected, 4)
+        self.assertEqual(self.broker.acked, 0)
+
+    def test_stop_drains_delivered_messages(self):
+        """
+        Test that stopping the consumer handles and acks the messages already delivered.
+
+        Returns:
+            None
+        """
+        # Arrange
+        self.publish(3)
+        consumer = BatchConsumer(
+            self.batches.append,
+            queue="test",
+            batch_size=10,
+            batch_timeout=60,
+            connection_factory=self.broker.connection,
+        )
+        thread = threading.Thread(target=consumer.run)
+
+        # Act
+        thread.start()
+        deadline = time.monotonic() + 5
+        while self.broker.delivered < 3:
+            self.assertLess(time.monotonic(), deadline, "messages were not delivered")
+            time.sleep(0.001)
+        consumer.stop()
+        thread.join(timeout=5)
+
+        # Assert
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(len(self.batches[0]), 3)
+        self.assertEqual(self.broker.acked, 3)
+
+    def test_prefetch_zero_is_unlimited(self):
+        """
+        Test that a prefetch count of 0 delivers messages without a prefetch limit.
+
+        Returns:
+            None
+        """
+        # Arrange
+        self.publish(30)
+
+        # Act
+        self.consume(self.batches.append, 30, prefetch_count=0, batch_size=10)
+
+        # Assert
+        self.assertEqual(self.broker.acked, 30)
+
+    def test_invalid_options_rejected(self):
+        """
+        Test that invalid consumer options raise ValueError, and CommandError from
+        the consume_orders command.
+
+        Returns:
+            None
+        """
+        # Act / Assert
+        with self.assertRaises(ValueError):
+            BatchConsumer(print, queue="test", workers=0)
+        with self.assertRaises(ValueError):
+            BatchConsumer(print, queue="test", prefetch_count=10, batch_size=20)
+        with self.assertRaises(CommandError):
+            call_command("consume_orders", "--prefetch", "10", "--batch-size", "20")
+        with self.assertRaises(CommandError):
+            call_command("consume_orders", "--workers", "0")
@@ -0,0 +1,297 @@
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Attributes:
+        name (str): Name of the operation, e.g. "GET user-service".
+        trace_id (str): 32 hex character identifier shared by all spans of a trace.
+        span_id (str): 16 hex character identifier of this span.
+        parent_id (str, optional): Identifier of the parent span, None for a root span.
+        attributes (dict): Key/value pairs describing the operation.
+        status (str): "ok" or "error".
+        start_time (int): Start timestamp in nanoseconds since the epoch.
+        end_time (int, optional): End timestamp in nanoseconds since the epoch.
+    """
+
+    sampled = True
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time_ns()
+        self.end_time = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_status(self, status):
+        self.status = status
+
+    def record_exception(self, exc):
+        self.status = "error"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)
+
+    def traceparent(self):
+        """
+        Return the W3C `traceparent` header value identifying this span.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": (self.end_time - self.start_time) / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _RemoteSpan:
+    """
+    The parent span of an incoming request, parsed from its `traceparent` header.
+    """
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class _NonRecordingSpan:
+    """
+    Stand-in for a span that is not recorded. All operations are no-ops.
+
+    The span keeps its trace and span ids so that the decision not to sample is
+    propagated downstream with an unsampled `traceparent`.
+    """
+
+    sampled = False
+
+    def __init__(self, trace_id=None, span_id=None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_status(self, status):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+    def traceparent(self):
+        """
+        Return the W3C `traceparent` header value with the sampled flag unset.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-00"
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+
+def parse_traceparent(value):
+    """
+    Parse a W3C `traceparent` header value.
+
+    Parameters:
+        value (str): The header value, may be None.
+
+    Returns:
+        _RemoteSpan: The remote parent span, or None if the value is missing or malformed.
+    """
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return _RemoteSpan(trace_id, span_id, sampled=bool(int(flags, 16) & 0x01))
+
+
+class ConsoleExporter:
+    """
+    Write finished spans as JSON lines to a stream, stdout by default.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class FileExporter(ConsoleExporter):
+    """
+    Append finished spans as JSON lines to a local file.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(stream=open(path, "a", buffering=1))
+
+
+class Tracer:
+    """
+    Create spans and propagate trace context across service boundaries.
+
+    A new trace is sampled with probability `sample_rate`; spans continuing an
+    existing trace follow the sampling decision of their parent. Unsampled
+    spans are never allocated or exported.
+
+    The tracer is disabled when `sample_rate` is 0 or there is no exporter. A
+    disabled tracer ignores incoming trace context, records nothing and injects
+    no headers, so tracing costs close to nothing.
+
+    Parameters:
+        sample_rate (float): Probability in [0, 1] of sampling a new trace.
+        exporter: Object with an `export(span)` method called for each finished span.
+    """
+
+    def __init__(self, sample_rate=0.0, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.enabled = sample_rate > 0 and exporter is not None
+
+    def _should_sample(self):
+        return random.random() < self.sample_rate
+
+    @contextmanager
+    def start_span(self, name, attributes=None, traceparent=None):
+        """
+        Start a span as a child of the current span and make it current.
+
+        Parameters:
+            name (str): Name of the operation.
+            attributes (dict, optional): Initial span attributes.
+            traceparent (str, optional): Incoming `traceparent` header to continue.
+                Only used when there is no current span.
+
+        Yields:
+            Span: The new span, or a non-recording span if the trace is not sampled.
+        """
+        if not self.enabled:
+            yield NON_RECORDING_SPAN
+            return
+
+        parent = _current_span.get()
+        if parent is None and traceparent:
+            parent = parse_traceparent(traceparent)
+
+        if parent is None:
+            sampled = self._should_sample()
+        else:
+            sampled = parent.sampled
+
+        if parent is None:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        else:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+
+        if not sampled:
+            span = _NonRecordingSpan(trace_id, f"{random.getrandbits(64):016x}")
+            token = _current_span.set(span)
+            try:
+                yield span
+            finally:
+                _current_span.reset(token)
+            return
+
+        span = Span(name, trace_id, parent_id, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time_ns()
+            self.exporter.export(span)
+
+    def inject(self, headers):
+        """
+        Add the `traceparent` of the current span to a mapping of outgoing headers.
+
+        Unsampled spans are propagated too, with the sampled flag unset.
+
+        Parameters:
+            headers (dict): HTTP or AMQP headers, updated in place.
+
+        Returns:
+            dict: The same `headers` mapping.
+        """
+        if not self.enabled:
+            return headers
+
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent()
+        return headers
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Return the tracer configured by the `TRACING_*` settings, building it on first use.
+
+    Returns:
+        Tracer: The process wide tracer.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                exporter = None
+                if settings.TRACING_SAMPLE_RATE > 0 and settings.TRACING_EXPORTER:
+                    exporter_class = import_string(settings.TRACING_EXPORTER)
+                    exporter = exporter_class(**settings.TRACING_EXPORTER_OPTIONS)
+                _tracer = Tracer(settings.TRACING_SAMPLE_RATE, exporter)
+    return _tracer
+
+
+@receiver(setting_changed)
+def reset_tracer(*, setting, **kwargs):
+    """
+    Drop the cached tracer when a `TRACING_*` setting is overridden, e.g. in tests.
+    """
+    global _tracer
+    if setting.startswith("TRACING_"):
+        _tracer = None
@@ -0,0 +1,235 @@
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+from .tracing import get_tracer
+
+
+class NoEndpointsConfigured(Exception):
+    """
+    Raised when an upstream service is requested that has no endpoints configured.
+    """
+
+
+class Endpoint:
+    """
+    A single replica of an upstream service.
+
+    Each endpoint owns its own `requests.Session` so that keep-alive connections
+    are pooled per replica, and tracks the number of in-flight requests and
+    consecutive failures used for load balancing and passive ejection.
+
+    Attributes:
+        base_url (str): Base URL of the replica, e.g. "http://product-service:8080".
+        session (requests.Session): Session with a dedicated connection pool.
+        outstanding (int): Number of requests currently in flight.
+        consecutive_failures (int): Failures since the last successful request.
+        ejected_until (float): Monotonic timestamp until which the endpoint is ejected.
+        ejection_count (int): Number of ejections since the endpoint last recovered.
+    """
+
+    def __init__(self, base_url, pool_maxsize=10):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejection_count = 0
+
+    def __repr__(self):
+        return f"Endpoint({self.base_url!r})"
+
+    def is_healthy(self, now):
+        """
+        Return True if the endpoint is not currently ejected.
+        """
+        return now >= self.ejected_until
+
+
+class Upstream:
+    """
+    A named upstream service backed by one or more endpoints.
+
+    Requests are routed with client-side load balancing over the healthy
+    endpoints. An endpoint that fails `consecutive_failures` times in a row
+    (connection errors or 5xx responses) is ejected for `base_ejection_time`
+    seconds, multiplied by the number of times in a row it has been ejected and
+    capped at `max_ejection_time`. The first successful request after an ejection
+    has expired resets that count. If every endpoint is ejected, all of them are
+    considered again rather than failing the request outright.
+
+    Parameters:
+        name (str): Name of the service, used in error messages.
+        endpoints (list[str]): Base URLs of the replicas.
+        load_balancer (str): "least_outstanding" or "power_of_two".
+        timeout (float): Timeout in seconds for each request.
+        pool_maxsize (int): Maximum number of pooled connections per endpoint.
+        consecutive_failures (int): Failures before an endpoint is ejected.
+        base_ejection_time (float): Base ejection duration in seconds.
+        max_ejection_time (float): Upper bound for the ejection duration in seconds.
+    """
+
+    LOAD_BALANCERS = ("least_outstanding", "power_of_two")
+
+    def __init__(
+        self,
+        name,
+        endpoints,
+        load_balancer="least_outstanding",
+        timeout=5.0,
+        pool_maxsize=10,
+        consecutive_failures=3,
+        base_ejection_time=30.0,
+        max_ejection_time=300.0,
+    ):
+        if not endpoints:
+            raise NoEndpointsConfigured(f"No endpoints configured for {name}")
+        if load_balancer not in self.LOAD_BALANCERS:
+            raise ValueError(f"Unknown load balancer for {name}: {load_balancer}")
+
+        self.name = name
+        self.endpoints = [Endpoint(url, pool_maxsize) for url in endpoints]
+        self.load_balancer = load_balancer
+        self.timeout = timeout
+        self.consecutive_failures = consecutive_failures
+        self.base_ejection_time = base_ejection_time
+        self.max_ejection_time = max_ejection_time
+        self._lock = threading.Lock()
+
+    def _candidates(self, now):
+        healthy = [e for e in self.endpoints if e.is_healthy(now)]
+        return healthy or self.endpoints
+
+    def acquire(self):
+        """
+        Pick an endpoint and mark a request as outstanding on it.
+
+        Returns:
+            Endpoint: The chosen endpoint. Callers must pass it to `release`.
+        """
+        with self._lock:
+            candidates = self._candidates(time.monotonic())
+            if self.load_balancer == "power_of_two" and len(candidates) > 2:
+                candidates = random.sample(candidates, 2)
+            fewest = min(e.outstanding for e in candidates)
+            endpoint = random.choice([e for e in candidates if e.outstanding == fewest])
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint, success):
+        """
+        Mark a request on `endpoint` as finished and update its health.
+
+        Parameters:
+            endpoint (Endpoint): The endpoint returned by `acquire`.
+            success (bool): Whether the request succeeded.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            now = time.monotonic()
+            if success:
+                endpoint.consecutive_failures = 0
+                if endpoint.is_healthy(now):
+                    endpoint.ejection_count = 0
+                return
+
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.consecutive_failures:
+                endpoint.ejection_count += 1
+                duration = min(
+                    self.base_ejection_time * endpoint.ejection_count,
+                    self.max_ejection_time,
+                )
+                endpoint.ejected_until = now + duration
+                endpoint.consecutive_failures = 0
+
+    def get(self, path, **kwargs):
+        """
+        Send a GET request for `path` to one of the endpoints.
+
+        Parameters:
+            path (str): Path relative to the endpoint base URL, e.g. "/users/1".
+            **kwargs: Additional keyword arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The response from the chosen endpoint.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = self.acquire()
+        url = f"{endpoint.base_url}{path}"
+        success = False
+        tracer = get_tracer()
+        with tracer.start_span(
+            f"GET {self.name}", {"http.method": "GET", "http.url": url}
+        ) as span:
+            try:
+                headers = tracer.inject(dict(kwargs.pop("headers", None) or {}))
+                response = endpoint.session.get(url, headers=headers, **kwargs)
+                span.set_attribute("http.status_code", response.status_code)
+                success = response.status_code < 500
+                if not success:
+                    span.set_status("error")
+                return response
+            finally:
+                self.release(endpoint, success)
+
+
+class UpstreamRegistry:
+    """
+    Registry of the upstream services configured in `settings.UPSTREAMS`.
+
+    `settings.UPSTREAMS` maps a service name to its options, where "endpoints"
+    is a list of base URLs and any other key is passed to `Upstream`.
+    """
+
+    def __init__(self, config):
+        self._upstreams = {
+            name: Upstream(name, **options) for name, options in config.items()
+        }
+
+    def __getitem__(self, name):
+        try:
+            return self._upstreams[name]
+        except KeyError:
+            raise NoEndpointsConfigured(f"No endpoints configured for {name}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_upstream(name):
+    """
+    Return the `Upstream` registered under `name`, building the registry on first use.
+
+    Parameters:
+        name (str): Name of the service, e.g. "user-service".
+
+    Returns:
+        Upstream: The upstream service.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = UpstreamRegistry(settings.UPSTREAMS)
+    return _registry[name]
+
+
+@receiver(setting_changed)
+def reset_registry(*, setting, **kwargs):
+    """
+    Drop the cached registry when `UPSTREAMS` is overridden, e.g. in tests.
+    """
+    global _registry
+    if setting == "UPSTREAMS":
+        _registry = None
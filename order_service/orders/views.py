@@ -3,6 +3,12 @@ from .models import Order
 from .serializers import OrderSerializer
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
+from django.conf import settings
+from django.db import connection as db_connection
+from .tracing import get_tracer
+from .upstreams import get_upstream
+import contextvars
 import json
 import pika
 import requests
@@ -30,7 +36,8 @@ class OrderCreateView(generics.CreateAPIView):
         - 500 Internal Server Error: If there are issues fetching user or product information.
 
     Note: External service calls to user-service and product-service are performed concurrently
-          using ThreadPoolExecutor for improved performance.
+          using ThreadPoolExecutor for improved performance. The service endpoints are
+          configured in `settings.UPSTREAMS` and load balanced by `orders.upstreams`.
 
     """
 
@@ -48,8 +55,7 @@ class OrderCreateView(generics.CreateAPIView):
             str: Full name of the user.
         """
 
-        user_service_url = f"http://user-service:8080/users/{user_id}"
-        user_response = requests.get(user_service_url)
+        user_response = get_upstream("user-service").get(f"/users/{user_id}")
         user_response.raise_for_status()
         user_data = user_response.json()
         return f"{user_data.get('firstName', '')} {user_data.get('lastName', '')}"
@@ -65,38 +71,79 @@ class OrderCreateView(generics.CreateAPIView):
             tuple: A tuple containing product name and total amount.
         """
 
-        product_service_url = f"http://product-service:8080/products/{product_code}"
-        product_response = requests.get(product_service_url)
+        product_response = get_upstream("product-service").get(
+            f"/products/{product_code}"
+        )
         product_response.raise_for_status()
         product_data = product_response.json()
         return product_data.get("name", ""), product_data.get("price", 0.0)
 
     def create(self, request, *args, **kwargs):
         """
-        Create a new order by fetching user and product information concurrently.
+        Create a new order inside a root tracing span.
+
+        The span continues the trace of an incoming `traceparent` header, if any.
+        API exceptions, e.g. validation errors, are re-raised after the span has
+        recorded their status code, and only mark the span as an error for 5xx.
 
         Parameters:
             request: The HTTP request object.
             *args: Additional positional arguments.
             **kwargs: Additional keyword arguments.
 
+        Returns:
+            Response: HTTP response containing the order data or error information.
+        """
+        with get_tracer().start_span(
+            "OrderCreateView.create",
+            {"http.method": request.method, "http.route": request.path},
+            traceparent=request.headers.get("traceparent"),
+        ) as span:
+            try:
+                response = self.create_order(request)
+            except APIException as e:
+                api_exception = e
+                status_code = e.status_code
+            else:
+                api_exception = None
+                status_code = response.status_code
+            span.set_attribute("http.status_code", status_code)
+            if status_code >= 500:
+                span.set_status("error")
+
+        if api_exception is not None:
+            raise api_exception
+        return response
+
+    def create_order(self, request):
+        """
+        Create a new order by fetching user and product information concurrently.
+
+        Parameters:
+            request: The HTTP request object.
+
         Returns:
             Response: HTTP response containing the order data or error information.
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        tracer = get_tracer()
 
         try:
             # Fetch customer_fullname from user-service in a separate thread
             user_id = serializer.validated_data["user_id"]
             with concurrent.futures.ThreadPoolExecutor() as executor:
-                user_fullname_future = executor.submit(self.fetch_user_info, user_id)
+                user_fullname_future = executor.submit(
+                    contextvars.copy_context().run, self.fetch_user_info, user_id
+                )
 
             # Fetch product_name and total_amount from product-service in a separate thread
             product_code = serializer.validated_data["product_code"]
             with concurrent.futures.ThreadPoolExecutor() as executor:
                 product_info_future = executor.submit(
-                    self.fetch_product_info, product_code
+                    contextvars.copy_context().run,
+                    self.fetch_product_info,
+                    product_code,
                 )
 
             # Wait for both threads to complete
@@ -109,39 +156,57 @@ class OrderCreateView(generics.CreateAPIView):
             serializer.validated_data["total_amount"] = total_amount
 
             # Perform the rest of the processing as before
-            self.perform_create(serializer)
+            with tracer.start_span(
+                "INSERT orders_order",
+                {"db.system": db_connection.vendor, "db.operation": "INSERT"},
+            ):
+                self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
 
             # Publish to RabbitMQ
-            with pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host="rabbitmq",
-                    credentials=pika.PlainCredentials("hellofresh", "food"),
-                )
-            ) as connection:
-                channel = connection.channel()
-                channel.exchange_declare(exchange="orders", exchange_type="direct")
-
-                message = {
-                    "producer": "Order Service",
-                    "sent_at": str(serializer.data["created_at"]),
-                    "type": "created_order",
-                    "payload": {
-                        "order": {
-                            "order_id": serializer.data["id"],
-                            "customer_fullname": serializer.data["customer_fullname"],
-                            "product_name": serializer.data["product_name"],
-                            "total_amount": serializer.data["total_amount"],
-                            "created_at": str(serializer.data["created_at"]),
-                        }
-                    },
-                }
-
-                channel.basic_publish(
-                    exchange="orders",
-                    routing_key="created_order",
-                    body=json.dumps(message),
-                )
+            with tracer.start_span(
+                "publish orders created_order",
+                {
+                    "messaging.system": "rabbitmq",
+                    "messaging.destination": "orders",
+                    "messaging.rabbitmq.routing_key": "created_order",
+                },
+            ):
+                with pika.BlockingConnection(
+                    pika.ConnectionParameters(
+                        host=settings.RABBITMQ_HOST,
+                        port=settings.RABBITMQ_PORT,
+                        credentials=pika.PlainCredentials(
+                            settings.RABBITMQ_USER, settings.RABBITMQ_PASSWORD
+                        ),
+                    )
+                ) as connection:
+                    channel = connection.channel()
+                    channel.exchange_declare(exchange="orders", exchange_type="direct")
+
+                    message = {
+                        "producer": "Order Service",
+                        "sent_at": str(serializer.data["created_at"]),
+                        "type": "created_order",
+                        "payload": {
+                            "order": {
+                                "order_id": serializer.data["id"],
+                                "customer_fullname": serializer.data[
+                                    "customer_fullname"
+                                ],
+                                "product_name": serializer.data["product_name"],
+                                "total_amount": serializer.data["total_amount"],
+                                "created_at": str(serializer.data["created_at"]),
+                            }
+                        },
+                    }
+
+                    channel.basic_publish(
+                        exchange="orders",
+                        routing_key="created_order",
+                        body=json.dumps(message),
+                        properties=pika.BasicProperties(headers=tracer.inject({})),
+                    )
 
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED, headers=headers